@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
 
 from collections import defaultdict, namedtuple, OrderedDict
-from functools import partial
+from functools import lru_cache, partial
+import hashlib
 import re
 import string
 import os
-import io
+import pickle
+import sys
+import tempfile
+import threading
+import unicodedata
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 _ROOT = os.path.abspath(os.path.dirname(__file__))
 
@@ -14,14 +24,37 @@ def get_data_path(path):
     return os.path.join(_ROOT, 'data', path)
 
 
+# build_index() results are cached here and rebuilt when the data files or this module change
+INDEX_CACHE = get_data_path('_index.pkl')
+# build_automaton() results depend on the installed pyahocorasick too, so they are cached
+# separately and never shipped
+AUTOMATON_CACHE = get_data_path('_automaton.pkl')
+
+
 COUNTRIES = 'countries'
 ADMIN_DIVISIONS = 'admin_divisions'
 CITIES = 'cities'
 NATIONALITIES = 'nationalities'
-MATCH_TYPES = {COUNTRIES, ADMIN_DIVISIONS, CITIES, NATIONALITIES}
+MATCH_TYPES = frozenset({COUNTRIES, ADMIN_DIVISIONS, CITIES, NATIONALITIES})
+
+# Plain dicts preserve insertion order from Python 3.7
+_OrderedDict = dict if sys.version_info >= (3, 7) else OrderedDict
+
+# str.isascii is new in Python 3.7 and takes constant time.  Before that, treat all text as
+# possibly non-ASCII rather than scanning it.
+_isascii = str.isascii if sys.version_info >= (3, 7) else (lambda s: False)
+
+# Index.meta maps each name to a bitmask of the match types it belongs to
+MATCH_TYPE_BITS = {CITIES: 1, ADMIN_DIVISIONS: 2, NATIONALITIES: 4, COUNTRIES: 8}
+
+PlaceData = namedtuple('PlaceData', ['country', 'population'])
+Index = namedtuple(
+    'Index',
+    [NATIONALITIES, CITIES, COUNTRIES, ADMIN_DIVISIONS, 'meta', 'max_words', 'automaton'],
+)
 
 # Common words that are also nationalities / admin divisions / cities
-BLACKLIST = {
+BLACKLIST = frozenset({
     'asia', # a city in the Phillipines
     'bar',
     'bay',
@@ -35,12 +68,19 @@ BLACKLIST = {
     'southern',
     'university',
     'western',
-}
+})
+
+# Assumes location names will be 4 words long at most
+MAX_NAME_WORDS = 4
+
+_NORMALIZE_RE = re.compile(r'[|\\/,\-]')
+_PUNCT = string.punctuation
+_PUNCT_SET = frozenset(_PUNCT)
 
 
 def read_table(
     filename, parse_keys=None, parse_value=None, sep='\t', comment='#', encoding='utf-8',
-    skip=0, collect_set=False,
+    skip=0, collect_set=False, normalize_keys=True,
 ):
     """Parse data files from the data directory
 
@@ -51,7 +91,7 @@ def read_table(
 
     parse_keys: callable
         function that takes a single argument, a list representing a row of data, and returns
-         a set of hashable objects to be used as keys in the dictionary being generated
+         an iterable of strings to be used as keys in the dictionary being generated
 
     parse_values: callable
         function that takes a single argument, a list representing a row of data, and returns
@@ -74,31 +114,45 @@ def read_table(
         if True, collect values for each row with the same key as a set instead of replacing
         previous values
 
+    normalize_keys: bool, default True
+        if True, case fold and normalize keys. Set to False for keys that are IDs rather than
+        names.
+
     Returns
     -------
     A dictionary with the same length as the number of unique keys in filename, plus associated
     aliases.
     """
 
-    with io.open(filename, 'r', encoding=encoding) as f:
-        # skip initial lines
-        for _ in range(skip):
-            next(f)
-
-        # filter comment lines
-        lines = (line for line in f if line.strip() and not line.startswith(comment))
-
-        d = defaultdict(set) if collect_set else dict()
-        for line in lines:
-            columns = line.rstrip('\n').split(sep)
-            value = parse_value(columns)
-            keys = parse_keys(columns)
-            for key in keys:
-                key = normalize(key.lower())
-                if collect_set:
-                    d[key].add(value)
-                else:
-                    d[key] = value
+    # Decoding the whole file at once is faster than iterating over it in text mode
+    with open(filename, 'rb') as f:
+        text = f.read().decode(encoding)
+    if '\r' in text:
+        # e.g. a checkout with Windows line endings
+        text = text.replace('\r\n', '\n')
+
+    keys = []
+    values = []
+    # skip initial lines and filter comment lines
+    for line in text.split('\n')[skip:]:
+        if not line.strip() or line.startswith(comment):
+            continue
+        columns = line.split(sep)
+        value = parse_value(columns)
+        for key in parse_keys(columns):
+            keys.append(key)
+            values.append(value)
+
+    if normalize_keys:
+        # Many names appear in more than one table, e.g. as a city and an admin division.
+        # Interning lets the index share a single copy of each.
+        keys = list(map(sys.intern, normalize_many(keys)))
+    if collect_set:
+        d = defaultdict(set)
+        for key, value in zip(keys, values):
+            d[key].add(value)
+    else:
+        d = dict(zip(keys, values))
     return d
 
 
@@ -107,34 +161,40 @@ def build_index():
 
     Returns
     -------
-    A namedtuple with five fields: nationalities cities countries admin_divisions meta
+    A namedtuple with seven fields: nationalities cities countries admin_divisions meta max_words
+    automaton.
+    automaton is always None here: load_index adds it if pyahocorasick is installed, so that the
+    rest of the index is the same for every install.
     """
 
     # get map of aliases keyed by geonameid
     aliases = read_table(
-        get_data_path('alternateNamesFiltered.txt'), collect_set=True,
-        parse_keys=lambda row: {row[1]},
+        get_data_path('alternateNamesFiltered.txt'), collect_set=True, normalize_keys=False,
+        parse_keys=lambda row: (row[1],),
         parse_value=lambda row: row[3],
     )
 
     # load custom aliases keyed by geonameid
     custom_aliases = read_table(
-        get_data_path('alternateNamesCustom.txt'), collect_set=True,
-        parse_keys=lambda row: {row[0]},
+        get_data_path('alternateNamesCustom.txt'), collect_set=True, normalize_keys=False,
+        parse_keys=lambda row: (row[0],),
         parse_value=lambda row: row[1],
     )
     for geoname_id, alias_set in custom_aliases.items():
         aliases[geoname_id] |= alias_set
 
     def with_aliases(name_set, alias_key):
-        if alias_key in aliases:
-            name_set.update(aliases[alias_key])
+        alias_set = aliases.get(alias_key)
+        if alias_set:
+            name_set.update(alias_set)
         return name_set
 
-    PlaceData = namedtuple('PlaceData', ['country', 'population'])
+    # Share equal values, and the few hundred country codes, between all rows
+    places = {}
     def get_place_value(row, country_index=None, pop_index=None):
             population = 0 if pop_index is None else int(row[pop_index])
-            return PlaceData(row[country_index], population)
+            place = PlaceData(sys.intern(row[country_index]), population)
+            return places.setdefault(place, place)
 
     # parse http://download.geonames.org/export/dump/countryInfo.txt
     countries = read_table(
@@ -145,7 +205,7 @@ def build_index():
 
     nationalities = read_table(
         get_data_path('nationalities.txt'), sep=':',
-        parse_keys=lambda row: {row[0]},
+        parse_keys=lambda row: (row[0],),
         parse_value=partial(get_place_value, country_index=1),
     )
     for n in countries:
@@ -180,19 +240,166 @@ def build_index():
         parse_value=partial(get_place_value, country_index=8, pop_index=14),
     )
 
-    meta = defaultdict(set)
+    # Start from the largest table in bulk, merge the others in, then drop blacklisted names
+    meta = dict.fromkeys(admin_divisions, MATCH_TYPE_BITS[ADMIN_DIVISIONS])
+    meta_get = meta.get
     for match_type, index in [
         (CITIES, cities),
-        (ADMIN_DIVISIONS, admin_divisions),
         (NATIONALITIES, nationalities),
         (COUNTRIES, countries),
     ]:
+        bit = MATCH_TYPE_BITS[match_type]
         for name in index:
-            if name not in BLACKLIST:
-                meta[name].add(match_type)
+            meta[name] = meta_get(name, 0) | bit
+    for name in BLACKLIST:
+        meta.pop(name, None)
+
+    # Longest name (in words) starting with each word and each pair of words, so that the token
+    # scan in GeoText.parse_aggressive only tries candidate lengths that can possibly match.
+    # Words never contain spaces, so the two kinds of keys can share one dict.
+    max_words = {}
+    for name in meta:
+        words = name.split()
+        n_words = min(len(words), MAX_NAME_WORDS)
+        if n_words > max_words.get(words[0], 0):
+            max_words[words[0]] = n_words
+        if n_words > 1:
+            pair = ' '.join(words[:2])
+            if n_words > max_words.get(pair, 0):
+                max_words[pair] = n_words
+
+    return Index(nationalities, cities, countries, admin_divisions, meta, max_words, None)
+
+
+def build_automaton(meta):
+    """Build an Aho-Corasick automaton that finds every name of meta in a text in a single pass
+
+    Names are padded with spaces so that hits align with token boundaries.  Requires
+    pyahocorasick.
+    """
+    automaton = ahocorasick.Automaton()
+    # Only a few thousand distinct payloads exist, so share them between names
+    payloads = {}
+    for name, mask in meta.items():
+        n_words = len(name.split())
+        if n_words <= MAX_NAME_WORDS:
+            key = ' %s ' % name
+            payload = (n_words, len(key), mask)
+            automaton.add_word(key, payloads.setdefault(payload, payload))
+    automaton.make_automaton()
+    return automaton
+
+
+def get_index_signature():
+    """Identify the inputs of build_index(), to decide whether a cached index is stale
+
+    Based on the contents of the files rather than their modification times, so that an index
+    built before packaging (``make index``) is still valid once installed.
+    """
+    data_dir = get_data_path('')
+    data_files = sorted(name for name in os.listdir(data_dir) if name.endswith('.txt'))
+    digest = hashlib.sha1()
+    for path in [os.path.join(data_dir, name) for name in data_files] + [__file__]:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return (data_files, digest.hexdigest())
+
+
+def get_automaton_signature(index_signature):
+    """Identify the inputs of build_automaton(), to decide whether a cached automaton is stale
+
+    pyahocorasick pickles automatons in its own format, so a cache is only reused with the exact
+    build of pyahocorasick that wrote it.
+    """
+    with open(ahocorasick.__file__, 'rb') as f:
+        return (index_signature, hashlib.sha1(f.read()).hexdigest())
 
-    Index = namedtuple('Index', [NATIONALITIES, CITIES, COUNTRIES, ADMIN_DIVISIONS, 'meta'])
-    return Index(nationalities, cities, countries, admin_divisions, meta)
+
+def read_index_cache(path, signature):
+    """Load an index (or automaton) saved by write_index_cache
+
+    Returns
+    -------
+    The cached object, or None if there is no usable cache for this signature
+    """
+    try:
+        with open(path, 'rb') as f:
+            if pickle.load(f) != signature:
+                return None
+            return pickle.load(f)
+    except Exception:
+        # Missing, truncated or written by an incompatible version of Python
+        return None
+
+
+def write_index_cache(path, signature, index):
+    """Save index (or automaton) to path, silently giving up if the directory is not writable"""
+    try:
+        # Write to a temporary file and move it in place, so that concurrent imports never
+        # see a partially written cache
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            # Every supported version of Python reads protocol 4, so a cache built for a
+            # release works everywhere
+            pickle.dump(signature, f, protocol=4)
+            pickle.dump(index, f, protocol=4)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+
+
+def load_index(cache_path=INDEX_CACHE, automaton_cache_path=AUTOMATON_CACHE):
+    """Load the index from cache_path, building and caching it first if necessary
+
+    If pyahocorasick is installed, the automaton is loaded from automaton_cache_path the same way.
+    """
+    signature = get_index_signature()
+    index = read_index_cache(cache_path, signature)
+    if index is None:
+        index = build_index()
+        write_index_cache(cache_path, signature, index)
+    if ahocorasick is not None:
+        automaton_signature = get_automaton_signature(signature)
+        automaton = read_index_cache(automaton_cache_path, automaton_signature)
+        if automaton is None:
+            automaton = build_automaton(index.meta)
+            write_index_cache(automaton_cache_path, automaton_signature, automaton)
+        index = index._replace(automaton=automaton)
+    return index
+
+
+class _LazyIndex(object):
+    """Class attribute that loads the index the first time it is used
+
+    Importing geotext stays cheap for code that never parses any text.  Loading is guarded by
+    a lock so that threads racing on the first parse load the index only once.
+    """
+
+    def __init__(self, load=load_index):
+        self._load = load
+        self._lock = threading.Lock()
+        self._index = None
+
+    def __get__(self, instance, owner):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._load()
+        return self._index
+
+
+def normalize_tokens(s):
+    """Split s into words the way normalize does, without joining them back together"""
+    if _PUNCT_SET.isdisjoint(s):
+        # Most names contain no punctuation at all, so only whitespace needs normalizing
+        return s.split()
+    s = s.replace('.', '')
+    s = _NORMALIZE_RE.sub(' ', s)
+    return list(filter(None, [t.strip(_PUNCT) for t in s.split()]))
 
 
 def normalize(s):
@@ -203,10 +410,60 @@ def normalize(s):
     String with some punctuation removed and some punctuation replace
     with spaces.
     """
-    s = s.replace('.', '')
-    s = re.sub(r'[|\\/,\-]', ' ', s)
-    tokens = [t.strip(string.punctuation) for t in s.split()]
-    return ' '.join(t for t in tokens if t)
+    return ' '.join(normalize_tokens(s))
+
+
+@lru_cache(maxsize=131072)
+def index_key(s):
+    """Key of a location name in the index
+
+    Compatibility characters are replaced (NFKC), case is folded and punctuation and whitespace
+    are normalized.  Only used for lookups: the names reported to callers keep their original
+    form.
+    """
+    return ' '.join(normalize_tokens(unicodedata.normalize('NFKC', s).casefold()))
+
+
+def index_key_tokens(tokens):
+    """Index keys of a list of words, such as the output of normalize_tokens
+
+    Words whose key is not a single word, e.g. because a compatibility character stands for
+    punctuation, get an empty key, which matches no name.
+    """
+    if not tokens:
+        return []
+    text = ' '.join(tokens)
+    folded = unicodedata.normalize('NFKC', text)
+    if folded == unicodedata.normalize('NFC', text):
+        # Composing characters and folding case never add spaces or punctuation, so the whole
+        # text can be folded at once
+        return folded.casefold().split(' ')
+    keys = [index_key(token) for token in tokens]
+    return ['' if ' ' in key else key for key in keys]
+
+
+def normalize_many(strings):
+    """Case fold and normalize a list of strings
+
+    Same as ``[index_key(s) for s in strings]``, but folds and replaces punctuation in one pass
+    over all the strings, which is faster when loading the data files. The strings must not
+    contain newlines.
+    """
+    if not strings:
+        return []
+    text = unicodedata.normalize('NFKC', '\n'.join(strings)).casefold()
+    text = _NORMALIZE_RE.sub(' ', text.replace('.', ''))
+    normalized = []
+    for s in text.split('\n'):
+        if _PUNCT_SET.isdisjoint(s):
+            normalized.append(' '.join(s.split()))
+        else:
+            normalized.append(' '.join(filter(None, [t.strip(_PUNCT) for t in s.split()])))
+    return normalized
+
+
+def _empty_matches():
+    return {CITIES: [], ADMIN_DIVISIONS: [], NATIONALITIES: [], COUNTRIES: []}
 
 
 class GeoText(object):
@@ -221,18 +478,44 @@ class GeoText(object):
     "London"
 
     >>> GeoText('New York, Texas, and also China').country_mentions
-    OrderedDict([(u'US', 2), (u'CN', 1)])
+    {'US': 2, 'CN': 1}
 
     """
 
-    index = build_index()
+    index = _LazyIndex()
+
+    # Capitalized words, optionally joined by a space, hyphen or a preposition like "de".
+    # Matches only start at the first capital of a run: otherwise a long run of capitals with
+    # no lower case letter after it is rescanned from every position, which is quadratic.  With
+    # that, the stdlib engine scans in linear time.  RE2's Python binding matches the same
+    # strings but measured ~10x slower on this pattern because of its per-call overhead.
+    # Every part after the first letter may match nothing, so a match never needs to backtrack:
+    # where the stdlib supports them (3.11+), possessive quantifiers and an atomic group give
+    # the same matches without saving backtracking state.
+    if sys.version_info >= (3, 11):
+        _CITY_PATTERN = (
+            r"%(upper)s(?<!%(upper)s{2})%(upper)s*+%(lower)s++[ \-]?(?:d[a-u].)?"
+            r"(?>%(upper)s++%(lower)s++)*+"
+        )
+    else:
+        _CITY_PATTERN = (
+            r"%(upper)s(?<!%(upper)s{2})%(upper)s*%(lower)s+[ \-]?(?:d[a-u].)?"
+            r"(?:%(upper)s+%(lower)s+)*"
+        )
+    # Combining accents count as lower case, so that decomposed (NFD) text matches too
+    _CITY_RE = re.compile(
+        _CITY_PATTERN % {'upper': '[A-ZÀ-Ú]', 'lower': '[a-zà-ú\u0300-\u036f]'}
+    )
+    # The same pattern for text without accented letters, which the engine matches ~15% faster
+    _ASCII_CITY_RE = re.compile(_CITY_PATTERN % {'upper': '[A-Z]', 'lower': '[a-z]'})
 
     def __init__(self, text, country=None, aggressive=False):
         """
         Parameters
         ----------
         country: string
-            Limit city matches to the country with this country code\
+            Limit city, admin division and nationality matches to the country with this
+            country code
 
         aggressive: bool
             If True, be more liberal in finding candidate location names.  Ignore
@@ -240,94 +523,164 @@ class GeoText(object):
             characters.  This may be much slower for long text.
         """
         parsed = self.parse_aggressive(text) if aggressive else self.parse(text)
-        self.countries = parsed[COUNTRIES]
-        self.admin_divisions = parsed[ADMIN_DIVISIONS]
-        self.cities = parsed[CITIES]
-        self.nationalities = parsed[NATIONALITIES]
-
-        if country is not None:
-            self.cities = [
-                city for city in self.cities
-                if self.index.cities[city.lower()].country == country
-            ]
-            self.admin_divisions = [
-                division for division in self.admin_divisions
-                if self.index.cities[division.lower()] == country
-            ]
-            self.nationalities = [
-                nationality for nationality in self.nationalities
-                if self.index.nationalities[nationality.lower()] == country
-            ]
-
-        # Tabulate the number of times each country was mentioned
+
+        # Filter matches by country and tabulate the number of times each country was mentioned
+        # in a single pass over the matches of each type.
         # Order countries by number of different mentions and break ties using
-        # the maximum population of locations matched
+        # the maximum population of locations matched, then the country code
+        filtered = {}
         max_population = defaultdict(int)
         mentions = defaultdict(int)
         seen = set()
+        # A string matched as several types (e.g. a city and an admin division) has one key
+        keys = {}
         for match_type in MATCH_TYPES:
             index = getattr(self.index, match_type)
+            keep_all = country is None or match_type == COUNTRIES
+            kept = []
             new_matches = []
             for match_string in parsed[match_type]:
-                country, population = index[match_string.lower()]
-                max_population[country] = max(max_population[country], population)
-                if (country, match_string) not in seen:
+                key = keys.get(match_string)
+                if key is None:
+                    key = keys[match_string] = index_key(match_string)
+                place_country, population = index[key]
+                if keep_all or place_country == country:
+                    kept.append(match_string)
+                if population > max_population[place_country]:
+                    max_population[place_country] = population
+                if (place_country, match_string) not in seen:
                     # Don't count the same string multiple times for the same country
                     # This could happen if a string is both a city and an admin_division in the
                     # same country.
-                    mentions[country] += 1
-                    new_matches.append((country, match_string))
+                    mentions[place_country] += 1
+                    new_matches.append((place_country, match_string))
             # Update "seen" only after each type has been completely processed so that
             # "China China China" will correctly count as "{'CN': 3}" country_mentions.
             seen.update(new_matches)
+            filtered[match_type] = kept
 
-        self.country_mentions = OrderedDict(
-            sorted(
-                mentions.items(),
-                key=lambda x: (x[1], max_population[x[0]]),
-                reverse=True
+        self.countries = filtered[COUNTRIES]
+        self.admin_divisions = filtered[ADMIN_DIVISIONS]
+        self.cities = filtered[CITIES]
+        self.nationalities = filtered[NATIONALITIES]
+
+        # country_mentions is only sorted when it is first accessed
+        self._mentions = mentions
+        self._max_population = max_population
+        self._country_mentions = None
+
+    @property
+    def country_mentions(self):
+        """Dict of country code to number of mentions, most mentioned first
+
+        An OrderedDict on Python versions before 3.7
+        """
+        if self._country_mentions is None:
+            max_population = self._max_population
+            self._country_mentions = _OrderedDict(
+                sorted(
+                    self._mentions.items(),
+                    # Break remaining ties by country code, so that the order does not depend on
+                    # the order in which match types were processed
+                    key=lambda x: (-x[1], -max_population[x[0]], x[0]),
+                )
             )
-        )
+        return self._country_mentions
 
     @classmethod
     def parse_aggressive(cls, text):
-        tokens = normalize(text).split()
-        matches = {match_type: [] for match_type in MATCH_TYPES}
+        # Not cached like index_key, so whole documents don't fill up its cache
+        tokens = normalize_tokens(text)
+        # Names are looked up by the keys of the words, but reported as they appear in text
+        tokens_folded = index_key_tokens(tokens)
+        if cls.index.automaton is not None:
+            return cls._parse_aggressive_automaton(tokens, tokens_folded)
+        matches = _empty_matches()
+        appends = [(bit, matches[match_type].append) for match_type, bit in MATCH_TYPE_BITS.items()]
 
         # Track match length so we don't include substrings of previous matches
         # "New York City" should not match "New York" or "York"
+        meta_get = cls.index.meta.get
+        max_words_get = cls.index.max_words.get
         prev_match_len = 0
         for i in range(len(tokens)):
             prev_match_len = max(prev_match_len - 1, 0)
-            # Assumes location names will be 4 words long at most
-            for length in range(min(4, len(tokens) - i), prev_match_len, -1):
+            longest = max_words_get(tokens_folded[i], 0)
+            if not longest:
+                # No name starts with this word
+                continue
+            if longest > 1 and i + 1 < len(tokens):
+                # Longer names must also start with a known pair of words
+                longest = max_words_get(tokens_folded[i] + ' ' + tokens_folded[i + 1], 1)
+            for length in range(min(longest, len(tokens) - i), prev_match_len, -1):
+                mask = meta_get(' '.join(tokens_folded[i:i + length]))
+                if not mask:
+                    continue
                 candidate = ' '.join(tokens[i:i + length])
                 if len(candidate) < 3 and any(c.islower() for c in candidate):
                     # skip 2-char strings like 'la', but not 'LA' or '中国'
                     continue
-                match_types = cls.index.meta.get(candidate.lower())
-                if not match_types:
+                for bit, append in appends:
+                    if mask & bit:
+                        append(candidate)
+                prev_match_len = length
+                break
+        return matches
+
+    @classmethod
+    def _parse_aggressive_automaton(cls, tokens, tokens_folded):
+        """Same as the token scan in parse_aggressive, using the Aho-Corasick automaton"""
+        # Keys never contain spaces, so every token still starts after one
+        text = ' %s ' % ' '.join(tokens_folded)
+
+        # Collect all names found at each offset, keyed by their length in words
+        found = defaultdict(dict)
+        for end, (length, key_len, mask) in cls.index.automaton.iter(text):
+            found[end - key_len + 1][length] = mask
+
+        matches = _empty_matches()
+        appends = [(bit, matches[match_type].append) for match_type, bit in MATCH_TYPE_BITS.items()]
+        # Only visit offsets with a hit; the spaces skipped over give the token position
+        i = 0
+        prev_offset = 0
+        prev_match_len = 0
+        for offset in sorted(found):
+            skipped = text.count(' ', prev_offset, offset)
+            i += skipped
+            prev_offset = offset
+            prev_match_len = max(prev_match_len - skipped, 0)
+            names = found[offset]
+            for length in sorted(names, reverse=True) if len(names) > 1 else names:
+                if length <= prev_match_len:
+                    break
+                candidate = ' '.join(tokens[i:i + length])
+                if len(candidate) < 3 and any(c.islower() for c in candidate):
                     continue
-                for match_type in match_types:
-                    matches[match_type].append(candidate)
+                mask = names[length]
+                for bit, append in appends:
+                    if mask & bit:
+                        append(candidate)
                 prev_match_len = length
                 break
         return matches
 
     @classmethod
     def parse(cls, text):
-        matches = {match_type: [] for match_type in MATCH_TYPES}
-        city_regex = r"[A-ZÀ-Ú]+[a-zà-ú]+[ \-]?(?:d[a-u].)?(?:[A-ZÀ-Ú]+[a-zà-ú]+)*"
-        for candidate in re.findall(city_regex, text):
-            candidate = candidate.strip()
-            match_types = cls.index.meta.get(normalize(candidate).lower())
-            if not match_types:
-                continue
-            for match_type in match_types:
-                matches[match_type].append(candidate)
+        matches = _empty_matches()
+        appends = [(bit, matches[match_type].append) for match_type, bit in MATCH_TYPE_BITS.items()]
+        meta_get = cls.index.meta.get
         # Nationalities, like 'Spanish', often don't refer to locations, so don't return
         # these results unless we are using aggressive parsing
-        matches[NATIONALITIES] = []
+        not_nationality = ~MATCH_TYPE_BITS[NATIONALITIES]
+        city_re = cls._ASCII_CITY_RE if _isascii(text) else cls._CITY_RE
+        for candidate in city_re.findall(text):
+            candidate = candidate.strip()
+            mask = meta_get(index_key(candidate), 0) & not_nationality
+            if not mask:
+                continue
+            for bit, append in appends:
+                if mask & bit:
+                    append(candidate)
         return matches
 
 
@@ -19,7 +19,7 @@ test_requirements = [
 
 setup(
     name='geotext',
-    version='0.5.0.tubular3',
+    version='0.6.0.tubular1',
     description='Geotext extracts countriy and city mentions from text',
     long_description=readme + '\n\n' + history,
     author='Yaser Martinez Palenzuela',
@@ -34,13 +34,15 @@ setup(
         'geotext': ['geotext/data/*.txt'],
     },
     install_requires=requirements,
+    extras_require={
+        'fast': ['pyahocorasick'],
+    },
     license="MIT",
     zip_safe=False,
     keywords='geotext',
     classifiers=[
         'Intended Audience :: Developers',
         'License :: OSI Approved :: MIT License',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3.5',
         'Programming Language :: Python :: 3.6',
     ],
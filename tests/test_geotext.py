@@ -7,7 +7,11 @@ test_geotext
 Tests for `geotext` module.
 """
 
+import os
+import tempfile
+import unicodedata
 import unittest
+from unittest import mock
 import geotext
 
 
@@ -142,6 +146,12 @@ class TestGeotext(unittest.TestCase):
         expected = [('US', 1), ('GE', 1)]
         self.assertEqual(result, expected)
 
+        # Remaining ties are ordered by country code
+        text = 'Cuban and Brazilian music'
+        result = list(geotext.GeoText(text, aggressive=True).country_mentions.items())
+        expected = [('BR', 1), ('CU', 1)]
+        self.assertEqual(result, expected)
+
         # New York is both a city and an admin_division in US, but it should only count as one
         # country mention for each time it appears in the text.
         text = 'I was born in New York, raised in New York, and will die in New York'
@@ -214,6 +224,106 @@ class TestGeotext(unittest.TestCase):
         self.assertEqual(result.cities, expected_cities)
         self.assertEqual(result.countries, expected_countries)
 
+    def test_country_filter(self):
+
+        text = 'Rio de Janeiro y Havana'
+        result = geotext.GeoText(text, 'BR')
+        self.assertEqual(result.cities, ['Rio de Janeiro'])
+        self.assertEqual(result.admin_divisions, ['Rio de Janeiro'])
+
+        text = 'Brazilian and Cuban music'
+        result = geotext.GeoText(text, 'CU', aggressive=True)
+        self.assertEqual(result.nationalities, ['Cuban'])
+
+    def test_hyphenated_names(self):
+
+        text = 'We spent a weekend in Baden-Baden'
+        result = geotext.GeoText(text)
+        self.assertEqual(result.cities, ['Baden-Baden'])
+        self.assertEqual(list(result.country_mentions.items()), [('DE', 1)])
+
+    def test_unicode_normalization(self):
+
+        # Decomposed accents and compatibility characters match the names in the index, but
+        # names are returned as they appear in the text
+        text = unicodedata.normalize('NFD', 'Vou para São Paulo')
+        self.assertEqual(geotext.GeoText(text).cities, [text[9:]])
+
+        text = unicodedata.normalize('NFD', 'Visiting Zürich')
+        self.assertEqual(geotext.GeoText(text, aggressive=True).cities, [text[9:]])
+
+        result = geotext.GeoText('Visiting Ｔｏｋｙｏ', aggressive=True)
+        self.assertEqual(result.cities, ['Ｔｏｋｙｏ'])
+        self.assertEqual(list(result.country_mentions.items()), [('JP', 1)])
+
+        result = geotext.GeoText('Lahti, ﬁnland', aggressive=True)
+        self.assertEqual(result.countries, ['ﬁnland'])
+
+        result = geotext.GeoText('อำเภอปากเกร็ด', aggressive=True)
+        self.assertEqual(result.admin_divisions, ['อำเภอปากเกร็ด'])
+
+    @unittest.skipIf(geotext.geotext.ahocorasick is None, 'pyahocorasick is not installed')
+    def test_aggressive_token_scan(self):
+
+        # Without pyahocorasick, parse_aggressive scans tokens instead of using the automaton.
+        # Both must find the same names.
+        with mock.patch.object(geotext.geotext, 'ahocorasick', None):
+            token_scan_index = geotext.geotext.load_index()
+        self.assertIsNone(token_scan_index.automaton)
+
+        class TokenScanGeoText(geotext.GeoText):
+            index = token_scan_index
+
+        with open(geotext.geotext.get_data_path('cities15000.txt'), encoding='utf-8') as f:
+            names = [line.split('\t')[1] for line in f if line.strip()][::40]
+        texts = [
+            ', '.join(names[i:i + 20]) + ' and ' + ' / '.join(names[i:i + 5]).lower()
+            for i in range(0, len(names), 20)
+        ]
+        texts.append(
+            'I was born in New York City, raised in New York and moved to Rio de Janeiro, '
+            'São Paulo, St. Louis and Baden-Baden. Brazilian and Cuban music. la LA'
+        )
+        for text in texts:
+            self.assertEqual(
+                TokenScanGeoText.parse_aggressive(text), geotext.GeoText.parse_aggressive(text)
+            )
+
+    def test_long_uppercase_text(self):
+
+        # Used to take quadratic time in the length of the run of capitals
+        result = geotext.GeoText('A' * 50000 + ' Paris')
+        self.assertEqual(result.cities, ['Paris'])
+
+    def test_index_cache(self):
+
+        # load_index caches the automaton separately, and it is large to pickle
+        index = geotext.GeoText.index._replace(automaton=None)
+        signature = geotext.geotext.get_index_signature()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'index.pkl')
+            self.assertIsNone(geotext.geotext.read_index_cache(path, signature))
+
+            geotext.geotext.write_index_cache(path, signature, index)
+            cached = geotext.geotext.read_index_cache(path, signature)
+            self.assertEqual(cached.cities, index.cities)
+            self.assertEqual(cached.meta, index.meta)
+
+            # A cache built from different data files is ignored
+            self.assertIsNone(geotext.geotext.read_index_cache(path, ('stale',)))
+
+    def test_lazy_index(self):
+
+        calls = []
+
+        class Lazy(object):
+            index = geotext.geotext._LazyIndex(lambda: calls.append(1) or 'index')
+
+        self.assertEqual(calls, [])
+        self.assertEqual(Lazy.index, 'index')
+        self.assertEqual(Lazy().index, 'index')
+        self.assertEqual(calls, [1])
+
     def tearDown(self):
         pass
 